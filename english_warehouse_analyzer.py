@@ -1,5 +1,10 @@
+import numpy as np
 import pandas as pd
+import openpyxl
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
+import hashlib
 import os
 import sys
 import subprocess
@@ -7,6 +12,8 @@ import subprocess
 # --- Configuration (English) ---
 os.makedirs("outputs", exist_ok=True)
 DEADSTOCK_DAYS = 90 # Dead Stock criteria (days)
+CACHE_DIR = "cache" # Pickled copies of parsed sheets, refreshed whenever the source xlsx changes
+CACHE_VERSION = 2 # Part of the cache file name; bump whenever read_sheet_values parses sheets differently
 
 # File paths remain the same as they point to physical files
 file_map = {
@@ -30,19 +37,100 @@ warehouse_cols_map = {
 site_cols = ['DAS', 'MIR', 'SHU', 'AGI']
 target_month = "2025-06"
 
+# Monthly report column names, built once: (warehouse, In, Out, Stock) per supplier and the site cumulative columns
+warehouse_metric_cols = {supplier: [(w, f'{w}_In', f'{w}_Out', f'{w}_Stock') for w in cols] for supplier, cols in warehouse_cols_map.items()}
+site_cumulative_cols = [f'{s}_Cumulative_In' for s in site_cols]
+
 # --- Classification Data (English) ---
 # Defines warehouse types for later classification
 indoor_warehouses = {'DSV Indoor', 'Hauler Indoor', 'DSV Al Markaz', 'AAA Storage', 'DHL WH'}
 dangerous_warehouses = {'AAA Storage'}
 
-location_type_data = []
+# (Supplier, Warehouse) -> Classification
+location_type_map = {}
 for supplier, warehouse_cols in warehouse_cols_map.items():
     for loc in warehouse_cols:
         # Translate '위험' to 'Dangerous'
-        classification = 'Dangerous' if loc in dangerous_warehouses else ('Indoor' if loc in indoor_warehouses else 'Outdoor')
-        # Translate column names '공급사', '창고', '구분'
-        location_type_data.append({'Supplier': supplier, 'Warehouse': loc, 'Classification': classification})
-location_type_df = pd.DataFrame(location_type_data)
+        location_type_map[(supplier, loc)] = 'Dangerous' if loc in dangerous_warehouses else ('Indoor' if loc in indoor_warehouses else 'Outdoor')
+
+# --- Data Loading ---
+def read_sheet_values(excel_path, sheet_name):
+    """
+    Streams a sheet's cell values with openpyxl's read-only mode and builds the DataFrame in one shot.
+    The first row is the header; as in pd.read_excel, blank headers become 'Unnamed: i',
+    repeated headers get '.1', '.2', ... suffixes, and trailing empty rows/columns are dropped.
+    """
+    workbook = openpyxl.load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name]
+        # Files written by other tools can carry a stale <dimension>; read the real extent as read_excel does
+        worksheet.reset_dimensions()
+        rows = [list(row) for row in worksheet.iter_rows(values_only=True)]
+    finally:
+        workbook.close()
+    # Rows come back ragged: trim trailing empty cells and rows, then pad every row to the widest one
+    for row in rows:
+        while row and row[-1] is None:
+            row.pop()
+    while rows and not rows[-1]:
+        rows.pop()
+    width = max((len(row) for row in rows), default=0)
+    rows = [row + [None] * (width - len(row)) for row in rows]
+    header, data = (rows[0], rows[1:]) if rows else ([], [])
+    columns = [h if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+    # Same renaming order as read_excel: named columns first, and a suffix already used in the header is skipped
+    counts = {}
+    for i in [i for i, h in enumerate(header) if h is not None] + [i for i, h in enumerate(header) if h is None]:
+        base = name = columns[i]
+        count = counts.get(name, 0)
+        while count:
+            counts[base] = count + 1
+            name = f"{base}.{count}"
+            count = count + 1 if name in columns else counts.get(name, 0)
+        columns[i] = name
+        counts[name] = count + 1
+    return pd.DataFrame(data, columns=columns)
+
+def sheet_cache_path(excel_path, sheet_name):
+    """
+    Returns the cache file path of a sheet. It is keyed on the absolute path, so same-named
+    workbooks in different folders never share a cache file.
+    """
+    file_stem = os.path.splitext(os.path.basename(excel_path))[0]
+    path_key = hashlib.md5(os.path.abspath(excel_path).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, f"{file_stem}.{path_key}.{sheet_name}.v{CACHE_VERSION}.pkl")
+
+def is_cache_fresh(excel_path, sheet_name):
+    """
+    True when the sheet has a cached copy at least as new as the source file.
+    """
+    cache_path = sheet_cache_path(excel_path, sheet_name)
+    return os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(excel_path)
+
+def load_sheet(excel_path, sheet_name):
+    """
+    Reads a sheet from an Excel file, reusing the cached copy in CACHE_DIR when it is
+    newer than the source file. Pickle is used so mixed-type columns (e.g. numeric and
+    text 'Case No.') round-trip unchanged. An unreadable cache file is ignored and rebuilt.
+    """
+    cache_path = sheet_cache_path(excel_path, sheet_name)
+    if is_cache_fresh(excel_path, sheet_name):
+        try:
+            return pd.read_pickle(cache_path)
+        except Exception as e:
+            print(f" ⚠️ Cache unreadable, re-reading source: {cache_path} / {e}")
+
+    df = read_sheet_values(excel_path, sheet_name)
+    # Write to a temp file and swap it in, so an interrupted run never leaves a truncated cache behind
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        print(f" ⚠️ Cache skipped: {excel_path} / {e}")
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+    return df
 
 # --- Data Processing Function (Outputs English DataFrames) ---
 def process_supplier_file(excel_path, supplier_name, warehouse_cols, sheet_name):
@@ -51,7 +139,7 @@ def process_supplier_file(excel_path, supplier_name, warehouse_cols, sheet_name)
     All DataFrame columns and relevant values are in English.
     """
     try:
-        df = pd.read_excel(excel_path, sheet_name=sheet_name)
+        df = load_sheet(excel_path, sheet_name)
     except Exception as e:
         print(f" ⚠️ File Error: {excel_path} / {e}")
         return None, None # Return a tuple to match expected return values
@@ -63,165 +151,185 @@ def process_supplier_file(excel_path, supplier_name, warehouse_cols, sheet_name)
         df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce').fillna(1)
 
     # Ensure all location columns exist and are datetime objects
-    for col in warehouse_cols + site_cols:
+    location_cols = warehouse_cols + site_cols
+    for col in location_cols:
         if col not in df.columns: df[col] = pd.NaT
-    df[warehouse_cols + site_cols] = df[warehouse_cols + site_cols].apply(pd.to_datetime, errors='coerce')
+    # Native Excel dates already arrive as datetime64 and are left as is. Text/mixed columns are
+    # parsed one at a time, since pandas infers one date format per call and columns may differ.
+    for col in location_cols:
+        if not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors='coerce')
     
-    all_months = sorted(list(set(df[warehouse_cols + site_cols].unstack().dropna().dt.to_period('M'))))
-    month_strs = [str(m) for m in all_months]
+    # Flatten the location block row-major: cell (case i, column j) sits at i * len(location_cols) + j
+    flat_dates = pd.DatetimeIndex(df[location_cols].to_numpy().ravel())
+    month_strs = [str(m) for m in flat_dates.dropna().to_period('M').unique().sort_values()]
     
-    event_map, case_final_status = [], []
-
-    # Iterate through each row (case) to create a chronological event list
-    for idx, row in df.iterrows():
-        case, quantity = row.get('Case No.', f"Row_{idx}"), row['Quantity']
-        events = []
-        for w in warehouse_cols:
-            if pd.notna(row[w]): events.append({'date': row[w], 'loc': w, 'type': 'warehouse', 'qty': quantity})
-        for s in site_cols:
-            if pd.notna(row[s]): events.append({'date': row[s], 'loc': s, 'type': 'site', 'qty': quantity})
-        if not events: continue
-        events.sort(key=lambda x: x['date'])
-        
-        # Track the final status for Dead Stock analysis
-        last_event = events[-1]
-        case_final_status.append({
-            'Supplier': supplier_name, 'Case No.': case, 'Final_Location_Type': last_event['type'],
-            'Current_Location': last_event['loc'], 'Last_Arrival_Date': last_event['date'], 'Quantity': last_event['qty']
-        })
-        
-        # Process events into In/Out/Site_In types for monthly aggregation
-        prev_loc, prev_type = None, None
-        for event in events:
-            mon = str(event['date'].to_period('M'))
-            if event['type'] == 'warehouse':
-                event_map.append({'type': 'In', 'loc': event['loc'], 'month': mon, 'quantity': event['qty']})
-                prev_loc, prev_type = event['loc'], 'warehouse'
-            elif event['type'] == 'site':
-                if prev_type == 'warehouse' and prev_loc:
-                    event_map.append({'type': 'Out', 'loc': prev_loc, 'month': mon, 'quantity': event['qty']})
-                event_map.append({'type': 'Site_In', 'loc': event['loc'], 'month': mon, 'quantity': event['qty']})
-                prev_loc, prev_type = None, 'site' # Item is now at a site
+    # Chronological event list: every dated cell, ordered by (case, date). Date ties keep column
+    # order (warehouses before sites, then map order), as the original per-case stable sort did.
+    present = np.flatnonzero(flat_dates.notna())
+    case_idx, loc_idx = np.divmod(present, len(location_cols))
+    order = np.lexsort((loc_idx, flat_dates.asi8[present], case_idx))
+    case_idx, loc_idx, event_dates = case_idx[order], loc_idx[order], flat_dates[present[order]]
+    event_locs = np.array(location_cols, dtype=object)[loc_idx]
+    event_months = np.asarray(event_dates.to_period('M').astype(str), dtype=object)
+    event_qtys = df['Quantity'].to_numpy()[case_idx]
+    is_site = loc_idx >= len(warehouse_cols)
+    
+    # Track the final status for Dead Stock analysis: the last event of each case
+    is_last = np.ones(len(case_idx), dtype=bool)
+    is_last[:-1] = case_idx[1:] != case_idx[:-1]
+    case_nos = df['Case No.'].to_numpy() if 'Case No.' in df.columns else np.array([f"Row_{idx}" for idx in df.index], dtype=object)
+    case_status_df = pd.DataFrame({
+        'Supplier': supplier_name, 'Case No.': case_nos[case_idx[is_last]],
+        'Final_Location_Type': np.where(is_site[is_last], 'site', 'warehouse'),
+        'Current_Location': event_locs[is_last], 'Last_Arrival_Date': event_dates[is_last], 'Quantity': event_qtys[is_last]
+    })
     
-    # Aggregate events into a monthly report
-    consolidated_data, warehouse_stock, site_cumulative_in = [], {w: 0 for w in warehouse_cols}, {s: 0 for s in site_cols}
-    for m in month_strs:
-        if m > target_month: continue
-        row_data = {'Month': m, 'Supplier': supplier_name}
-        for w in warehouse_cols:
-            in_qty = sum(e['quantity'] for e in event_map if e['type'] == 'In' and e['loc'] == w and e['month'] == m)
-            out_qty = sum(e['quantity'] for e in event_map if e['type'] == 'Out' and e['loc'] == w and e['month'] == m)
-            warehouse_stock[w] += in_qty - out_qty
-            row_data[f'{w}_In'], row_data[f'{w}_Out'], row_data[f'{w}_Stock'] = in_qty, out_qty, warehouse_stock[w]
-        for s in site_cols:
-            in_qty = sum(e['quantity'] for e in event_map if e['type'] == 'Site_In' and e['loc'] == s and e['month'] == m)
-            site_cumulative_in[s] += in_qty
-            row_data[f'{s}_In'], row_data[f'{s}_Cumulative_In'] = in_qty, site_cumulative_in[s]
-        consolidated_data.append(row_data)
+    # Process events into In/Out/Site_In types for monthly aggregation: every warehouse event is an In,
+    # every site event a Site_In, and a site event directly after a warehouse event of the same case
+    # is also an Out from that warehouse.
+    follows_warehouse = np.zeros(len(case_idx), dtype=bool)
+    follows_warehouse[1:] = (case_idx[1:] == case_idx[:-1]) & ~is_site[:-1]
+    is_out = is_site & follows_warehouse
+    out_locs = np.roll(event_locs, 1)[is_out]
+    events_df = pd.concat([
+        pd.DataFrame({'type': 'In', 'loc': event_locs[~is_site], 'month': event_months[~is_site], 'quantity': event_qtys[~is_site]}),
+        pd.DataFrame({'type': 'Out', 'loc': out_locs, 'month': event_months[is_out], 'quantity': event_qtys[is_out]}),
+        pd.DataFrame({'type': 'Site_In', 'loc': event_locs[is_site], 'month': event_months[is_site], 'quantity': event_qtys[is_site]}),
+    ], ignore_index=True)
+    
+    # Aggregate events into a monthly report (one groupby instead of rescanning the events per cell)
+    report_months = [m for m in month_strs if m <= target_month]
+    if not report_months:
+        return pd.DataFrame(), case_status_df
+    monthly_qty = (events_df.groupby(['type', 'loc', 'month'])['quantity'].sum()
+                   .unstack('month', fill_value=0)
+                   .reindex(columns=report_months, fill_value=0))
+
+    def monthly_matrix(event_type, locs):
+        """Returns the (month x location) quantity matrix of one event type (0 where there were no events)."""
+        return monthly_qty.reindex(pd.MultiIndex.from_product([[event_type], locs]), fill_value=0).to_numpy().T
+
+    in_mat, out_mat, site_in_mat = monthly_matrix('In', warehouse_cols), monthly_matrix('Out', warehouse_cols), monthly_matrix('Site_In', site_cols)
+    stock_mat, site_cumulative_mat = np.cumsum(in_mat - out_mat, axis=0), np.cumsum(site_in_mat, axis=0)
+
+    consolidated_data = {'Month': report_months, 'Supplier': supplier_name}
+    for j, w in enumerate(warehouse_cols):
+        consolidated_data[f'{w}_In'], consolidated_data[f'{w}_Out'], consolidated_data[f'{w}_Stock'] = in_mat[:, j], out_mat[:, j], stock_mat[:, j]
+    for j, s in enumerate(site_cols):
+        consolidated_data[f'{s}_In'], consolidated_data[f'{s}_Cumulative_In'] = site_in_mat[:, j], site_cumulative_mat[:, j]
         
-    return pd.DataFrame(consolidated_data), pd.DataFrame(case_final_status)
+    return pd.DataFrame(consolidated_data), case_status_df
 
-def format_excel_sheet(df, writer, sheet_name, is_pivot=False):
-    """Utility function to write and format a sheet in the Excel file."""
-    # For pivot table, we need to handle multi-index headers
+def create_excel_formats(workbook):
+    """
+    Creates the cell formats shared by every report sheet, once per workbook.
+    """
+    return {
+        'header': workbook.add_format({'bold': True, 'text_wrap': True, 'valign': 'top', 'fg_color': '#D7E4BC', 'border': 1, 'align': 'center'}),
+        # Same display as DataFrame.to_excel's default datetime_format
+        'datetime': workbook.add_format({'num_format': 'YYYY-MM-DD HH:MM:SS'}),
+    }
+
+def format_excel_sheet(df, writer, sheet_name, formats, is_pivot=False):
+    """
+    Utility function to write and format a sheet in the Excel file.
+    Cells are written strictly row by row (header first): the workbook streams in constant_memory
+    mode, where rows above the current one can no longer be written.
+    """
+    # For pivot table, the index levels become the leading columns. A label is only shown on the
+    # first row of its block, as the merged index cells of DataFrame.to_excel displayed it.
     if is_pivot:
-        df.to_excel(writer, sheet_name=sheet_name, index=True)
-    else:
-        df.to_excel(writer, sheet_name=sheet_name, index=False)
-
-    workbook, worksheet = writer.book, writer.sheets[sheet_name]
-    header_format = workbook.add_format({'bold': True, 'text_wrap': True, 'valign': 'top', 'fg_color': '#D7E4BC', 'border': 1, 'align': 'center'})
-    num_format = workbook.add_format({'num_format': '#,##0'})
-    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
-    total_num_format = workbook.add_format({'bold': True, 'num_format': '#,##0', 'fg_color': '#F2F2F2'})
-    total_txt_format = workbook.add_format({'bold': True, 'fg_color': '#F2F2F2'})
-    
+        index_df = df.index.to_frame(index=False)
+        repeated = (index_df == index_df.shift()).cumprod(axis=1).astype(bool)
+        df = pd.concat([index_df.astype(object).mask(repeated), df.reset_index(drop=True)], axis=1)
+
+    worksheet = writer.book.add_worksheet(sheet_name)
+
+    # Adjust column width in one range call; datetime columns also get a datetime format, since their cells are written unformatted
+    worksheet.set_column(0, len(df.columns) - 1, 15)
+    for i, dtype in enumerate(df.dtypes):
+        if pd.api.types.is_datetime64_any_dtype(dtype): worksheet.set_column(i, i, 15, formats['datetime'])
+
     # Write headers
-    if is_pivot:
-        # Write index names
-        for i, name in enumerate(df.index.names):
-            worksheet.write(0, i, name, header_format)
-        # Write column headers
-        for c, val in enumerate(df.columns.values):
-            worksheet.write(0, len(df.index.names) + c, val, header_format)
-    else:
-        for c, val in enumerate(df.columns.values):
-            worksheet.write(0, c, val, header_format)
+    worksheet.write_row(0, 0, [str(col) for col in df.columns], formats['header'])
 
-    # Write data
-    # (Simplified formatting for brevity, can be expanded as before)
-    for i, col in enumerate(df.columns):
-        # Adjust column width
-        # This part is tricky for multi-index and left for simplicity.
-        # Can be set to a fixed width or calculated more carefully.
-        worksheet.set_column(i + (len(df.index.names) if is_pivot else 0), i + (len(df.index.names) if is_pivot else 0), 15)
+    # Write data (missing values become empty cells)
+    values = df.astype(object).where(df.notna(), None)
+    for r, row in enumerate(values.itertuples(index=False, name=None), start=1):
+        worksheet.write_row(r, 0, row)
 
 
 # --- Main Execution (English) ---
 def main():
     all_monthly_data, all_case_statuses = [], []
     print("🚀 Starting data processing...")
-    for supplier, path in file_map.items():
-        print(f"   - Processing: {supplier}")
-        monthly_df, status_df = process_supplier_file(path, supplier, warehouse_cols_map[supplier], sheet_name_map[supplier])
-        if monthly_df is not None: all_monthly_data.append(monthly_df)
-        if status_df is not None: all_case_statuses.append(status_df)
+    jobs = {supplier: (path, supplier, warehouse_cols_map[supplier], sheet_name_map[supplier]) for supplier, path in file_map.items()}
+    # A spawned worker re-imports pandas/numpy/openpyxl, which costs far more than processing a cached
+    # sheet. Only sheets that must be parsed from xlsx again go to worker processes, and only when
+    # there are several of them; everything else runs in this process.
+    to_parse = [supplier for supplier, (path, *_, sheet) in jobs.items() if os.path.exists(path) and not is_cache_fresh(path, sheet)]
+    executor = ProcessPoolExecutor(max_workers=len(to_parse)) if len(to_parse) > 1 else None
+    with executor or nullcontext():
+        futures = {supplier: executor.submit(process_supplier_file, *jobs[supplier]) for supplier in to_parse} if executor else {}
+        for supplier, job in jobs.items():
+            print(f"   - Processing: {supplier}")
+            monthly_df, status_df = futures[supplier].result() if supplier in futures else process_supplier_file(*job)
+            if monthly_df is not None: all_monthly_data.append(monthly_df)
+            if status_df is not None: all_case_statuses.append(status_df)
 
     if not all_monthly_data:
         print("⚠️ No data to process. Please check file paths and content.")
         return
 
     # 1. Prepare the detailed monthly status DataFrame
-    consolidated_df = pd.concat(all_monthly_data, ignore_index=True)
-    summary_rows = []
-    for supplier in file_map.keys():
-        s_data = consolidated_df[consolidated_df['Supplier'] == supplier]
-        if not s_data.empty:
-            s_row = {'Month': 'TOTAL', 'Supplier': supplier}
-            for col in s_data.columns[2:]: s_row[col] = s_data[col].iloc[-1] if 'Stock' in col or 'Cumulative' in col else s_data[col].sum()
-            summary_rows.append(s_row)
-    if summary_rows:
-        consolidated_df = pd.concat([consolidated_df, pd.DataFrame(summary_rows)], ignore_index=True)
-    consolidated_df.sort_values(by=['Supplier', 'Month'], inplace=True, ignore_index=True)
+    supplier_blocks = [df for df in all_monthly_data if not df.empty]
+    consolidated_df = pd.concat(supplier_blocks, ignore_index=True)
+    # TOTAL row per supplier: In/Out are summed, Stock/Cumulative take the last month's value
+    value_cols = consolidated_df.columns[2:]
+    total_rows_df = consolidated_df.groupby('Supplier', sort=False).agg(
+        {col: 'last' if 'Stock' in col or 'Cumulative' in col else 'sum' for col in value_cols}
+    ).reset_index()
+    total_rows_df.insert(0, 'Month', 'TOTAL')
+    # Each supplier block is already month-sorted, so its TOTAL row simply follows it (no full sort needed)
+    total_parts = [total_rows_df.iloc[[i]] for i in range(len(total_rows_df))]
+    consolidated_df = pd.concat([part for pair in zip(supplier_blocks, total_parts) for part in pair], ignore_index=True)
 
     print("   - Generating summary data...")
-    total_rows_df = pd.DataFrame(summary_rows)
     
     # 2. Prepare data for "Overall_Supplier_Summary" sheet
     # (Logic remains the same)
+    total_rows = total_rows_df.to_dict('records')
     summary_list = []
-    if not total_rows_df.empty:
-        for _, row in total_rows_df.iterrows():
-            supplier, wh_cols = row['Supplier'], warehouse_cols_map[row['Supplier']]
-            summary_list.append({
-                'Supplier': supplier,
-                'Total Warehouse In': sum(row.get(f'{w}_In', 0) for w in wh_cols),
-                'Total Warehouse Out': sum(row.get(f'{w}_Out', 0) for w in wh_cols),
-                'Final Warehouse Stock': sum(row.get(f'{w}_Stock', 0) for w in wh_cols),
-                'Final Site Cumulative In': sum(row.get(f'{s}_Cumulative_In', 0) for s in site_cols)
-            })
+    for row in total_rows:
+        metric_cols = warehouse_metric_cols[row['Supplier']]
+        summary_list.append({
+            'Supplier': row['Supplier'],
+            'Total Warehouse In': sum(row.get(in_col, 0) for _, in_col, _, _ in metric_cols),
+            'Total Warehouse Out': sum(row.get(out_col, 0) for _, _, out_col, _ in metric_cols),
+            'Final Warehouse Stock': sum(row.get(stock_col, 0) for _, _, _, stock_col in metric_cols),
+            'Final Site Cumulative In': sum(row.get(col, 0) for col in site_cumulative_cols)
+        })
+    if summary_list:
+        grand_total = {'Supplier': 'GRAND TOTAL'}
+        for key in summary_list[0]:
+            if key != 'Supplier': grand_total[key] = sum(row[key] for row in summary_list)
+        summary_list.append(grand_total)
     overall_summary_df = pd.DataFrame(summary_list)
-    if not overall_summary_df.empty:
-        grand_total = overall_summary_df.drop(columns='Supplier').sum()
-        grand_total['Supplier'] = 'GRAND TOTAL'
-        overall_summary_df = pd.concat([overall_summary_df, pd.DataFrame([grand_total])], ignore_index=True)
 
     # 3. Prepare data for "Warehouse_Stock_Summary" sheet
     # (Logic remains the same)
     warehouse_summary_list = []
-    if not total_rows_df.empty:
-        for _, row in total_rows_df.iterrows():
-            for warehouse in warehouse_cols_map[row['Supplier']]:
-                warehouse_summary_list.append({
-                    'Supplier': row['Supplier'], 'Warehouse': warehouse,
-                    'Total In': row.get(f'{warehouse}_In', 0),
-                    'Total Out': row.get(f'{warehouse}_Out', 0),
-                    'Current Stock': row.get(f'{warehouse}_Stock', 0)
-                })
+    for row in total_rows:
+        for warehouse, in_col, out_col, stock_col in warehouse_metric_cols[row['Supplier']]:
+            warehouse_summary_list.append({
+                'Supplier': row['Supplier'], 'Warehouse': warehouse,
+                'Classification': location_type_map.get((row['Supplier'], warehouse)),
+                'Total In': row.get(in_col, 0),
+                'Total Out': row.get(out_col, 0),
+                'Current Stock': row.get(stock_col, 0)
+            })
     warehouse_summary_df = pd.DataFrame(warehouse_summary_list)
-    if not warehouse_summary_df.empty:
-        warehouse_summary_df = pd.merge(warehouse_summary_df, location_type_df, on=['Supplier', 'Warehouse'], how='left')
-        warehouse_summary_df = warehouse_summary_df[['Supplier', 'Warehouse', 'Classification', 'Total In', 'Total Out', 'Current Stock']]
     
     # 4. NEW: Prepare data for "Pivoted_Monthly_Summary" sheet
     print("   - Generating pivoted summary data...")
@@ -236,19 +344,22 @@ def main():
     long_df[['Warehouse', 'Metric']] = long_df['Location_Metric'].str.rsplit('_', n=1, expand=True)
     long_df.drop(columns='Location_Metric', inplace=True)
 
-    # Merge with classification data to get warehouse type
-    pivoted_summary_df = pd.merge(long_df, location_type_df, on=['Supplier', 'Warehouse'], how='left')
-    
-    # Aggregate by Month, Supplier, Classification, and Metric
-    pivoted_summary_df = pivoted_summary_df.groupby(['Month', 'Supplier', 'Classification', 'Metric'])['Value'].sum().reset_index()
+    # Look up the warehouse type (sites have none and drop out of the pivot)
+    long_df['Classification'] = pd.MultiIndex.from_arrays([long_df['Supplier'], long_df['Warehouse']]).map(location_type_map).to_numpy()
+
+    # Low-cardinality keys as categoricals: grouping hashes small integer codes instead of strings.
+    # observed=True keeps only combinations that occur (no empty cartesian product).
+    for col in ['Supplier', 'Classification', 'Metric']:
+        long_df[col] = long_df[col].astype('category')
 
-    # Create the pivot table
-    pivoted_summary_df = pivoted_summary_df.pivot_table(
+    # Aggregate by Month, Classification, Metric and Supplier in a single pivot table
+    pivoted_summary_df = long_df.pivot_table(
         index=['Month', 'Classification', 'Metric'],
         columns='Supplier',
         values='Value',
         fill_value=0,
-        aggfunc='sum'
+        aggfunc='sum',
+        observed=True
     ).sort_index()
 
 
@@ -259,7 +370,9 @@ def main():
         case_status_df = pd.concat(all_case_statuses, ignore_index=True)
         in_warehouse_df = case_status_df[case_status_df['Final_Location_Type'] == 'warehouse'].copy()
         if not in_warehouse_df.empty:
-            in_warehouse_df['Days_Passed'] = (datetime.now() - in_warehouse_df['Last_Arrival_Date']).dt.days
+            # Last_Arrival_Date is datetime64 by construction, so whole days come from one int64 subtraction
+            arrival = in_warehouse_df['Last_Arrival_Date'].to_numpy(dtype='datetime64[ns]')
+            in_warehouse_df['Days_Passed'] = (np.datetime64(datetime.now(), 'ns') - arrival) // np.timedelta64(1, 'D')
             dead_stock_df = in_warehouse_df[in_warehouse_df['Days_Passed'] >= DEADSTOCK_DAYS].copy()
             dead_stock_df = dead_stock_df[['Supplier', 'Case No.', 'Current_Location', 'Last_Arrival_Date', 'Days_Passed', 'Quantity']]
             dead_stock_df.rename(columns={'Current_Location': 'Warehouse'}, inplace=True)
@@ -270,20 +383,23 @@ def main():
     output_filename = f"Consolidated_Inventory_Report_{timestamp}.xlsx"
     output_path = os.path.join("outputs", output_filename)
 
-    with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
-        format_excel_sheet(consolidated_df, writer, 'Consolidated_Status')
+    # constant_memory streams each row to disk as it is written instead of holding every cell until save
+    excel_options = {'constant_memory': True, 'strings_to_urls': False}
+    with pd.ExcelWriter(output_path, engine='xlsxwriter', engine_kwargs={'options': excel_options}) as writer:
+        formats = create_excel_formats(writer.book)
+        format_excel_sheet(consolidated_df, writer, 'Consolidated_Status', formats)
         print("   ✅ 'Consolidated_Status' sheet created.")
         if not overall_summary_df.empty:
-            format_excel_sheet(overall_summary_df, writer, 'Overall_Supplier_Summary')
+            format_excel_sheet(overall_summary_df, writer, 'Overall_Supplier_Summary', formats)
             print("   ✅ 'Overall_Supplier_Summary' sheet created.")
         if not warehouse_summary_df.empty:
-            format_excel_sheet(warehouse_summary_df, writer, 'Warehouse_Stock_Summary')
+            format_excel_sheet(warehouse_summary_df, writer, 'Warehouse_Stock_Summary', formats)
             print("   ✅ 'Warehouse_Stock_Summary' sheet created.")
         if not pivoted_summary_df.empty:
-            format_excel_sheet(pivoted_summary_df, writer, 'Pivoted_Monthly_Summary', is_pivot=True)
+            format_excel_sheet(pivoted_summary_df, writer, 'Pivoted_Monthly_Summary', formats, is_pivot=True)
             print("   ✅ 'Pivoted_Monthly_Summary' sheet created.")
         if not dead_stock_df.empty:
-            format_excel_sheet(dead_stock_df, writer, f'DeadStock_Analysis ({DEADSTOCK_DAYS}+ days)')
+            format_excel_sheet(dead_stock_df, writer, f'DeadStock_Analysis ({DEADSTOCK_DAYS}+ days)', formats)
             print(f"   ✅ 'DeadStock_Analysis' sheet created.")
 
     print(f"\n📦 '{output_filename}' has been created successfully!")
@@ -19,14 +19,16 @@ if __name__ == "__main__":
     output_dir = os.path.abspath(output_dir)
     os.makedirs(output_dir, exist_ok=True)
     
-    def add_total_row(df, label='총합'):
-        """총합 행 추가"""
+    def write_with_total_row(df, writer, sheet_name, index=True, label='총합', label_format=None):
+        """시트 기록 후 마지막 행 아래에 총합 행 추가 (pd.concat 없이)"""
+        df.to_excel(writer, sheet_name=sheet_name, index=index)
         sums = df.sum(numeric_only=True)
-        total_row = pd.DataFrame([sums], index=[label])
-        for col in df.columns:
-            if col not in sums.index:
-                total_row[col] = ''
-        return pd.concat([df, total_row], axis=0)
+        values = [sums[col] if col in sums.index else '' for col in df.columns]
+        worksheet = writer.sheets[sheet_name]
+        if index:
+            # 총합 라벨은 인덱스 셀 스타일로 기록
+            worksheet.write(len(df) + 1, 0, label, label_format)
+        worksheet.write_row(len(df) + 1, 1 if index else 0, values)
     
     def format_index_to_ymd(df):
         """날짜 포맷을 yyyy-mm-dd로 변환"""
@@ -39,24 +41,22 @@ if __name__ == "__main__":
     
     # 개선된 분석 결과를 엑셀로 저장
     output_excel = os.path.join(output_dir, '개선된_월별_창고_현장_입출고재고_집계.xlsx')
-    with pd.ExcelWriter(output_excel, engine='openpyxl') as writer:
+    with pd.ExcelWriter(output_excel, engine='xlsxwriter') as writer:
+        # pandas 1.5/2.x가 인덱스 셀에 적용하던 스타일 (굵게, 얇은 테두리, 가운데/위 정렬) - 총합 라벨용
+        index_format = writer.book.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
         # 창고별 월별 입출고/재고
         for warehouse, stock_df in results['warehouse_stock'].items():
-            df_with_total = add_total_row(stock_df)
-            df_with_total = format_index_to_ymd(df_with_total)
-            df_with_total.to_excel(writer, sheet_name=f'창고_{warehouse}')
+            write_with_total_row(format_index_to_ymd(stock_df.copy()), writer, f'창고_{warehouse}', label_format=index_format)
         
         # 현장별 월별 입고/누적재고
         for site, stock_df in results['site_stock'].items():
-            df_with_total = add_total_row(stock_df)
-            df_with_total = format_index_to_ymd(df_with_total)
-            df_with_total.to_excel(writer, sheet_name=f'Site_{site}')
+            write_with_total_row(format_index_to_ymd(stock_df.copy()), writer, f'Site_{site}', label_format=index_format)
         
         # Dead Stock 분석
         if len(results['dead_stock']) > 0:
             dead_stock_formatted = results['dead_stock'].copy()
             dead_stock_formatted['마지막입고일'] = dead_stock_formatted['마지막입고일'].dt.strftime('%Y-%m-%d')
-            add_total_row(dead_stock_formatted).to_excel(writer, sheet_name='DeadStock_90일+', index=False)
+            write_with_total_row(dead_stock_formatted, writer, 'DeadStock_90일+', index=False)
         
         # 요약 정보
         summary_data = []
@@ -79,7 +79,7 @@ if __name__ == "__main__":
             })
         
         summary_df = pd.DataFrame(summary_data)
-        add_total_row(summary_df).to_excel(writer, sheet_name='요약', index=False)
+        write_with_total_row(summary_df, writer, '요약', index=False)
     
     print(f"\n=== 분석 완료 ===")
     print(f"결과 파일: {output_excel}")